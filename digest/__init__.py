@@ -50,25 +50,91 @@ __license__ = "Apache Software License Version 2.0"
 
 __all__ = ["digest", "main"]
 
+# The whole utility lives in this one module, and the I/O strategies it
+# picks between (each documented) take it past pylint's length limit.
+# pylint: disable=too-many-lines
+
 # ---------------------------------------------------------------------------
 # Imports
 # ---------------------------------------------------------------------------
 
-import argparse
 import hashlib
+import mmap
 import os
+import stat
 import sys
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
 from dataclasses import dataclass
-from typing import BinaryIO, NoReturn, Optional
+from functools import lru_cache, partial
+from importlib import import_module
+from threading import Thread, current_thread, local, main_thread
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Iterator,
+    List,
+    NoReturn,
+    Optional,
+)
 from typing import Sequence as Seq
+from typing import Tuple, Union
+
+# concurrent.futures (which pulls in logging, among other things) and queue
+# are only needed for some files, so they're only imported where they're
+# needed, to keep startup fast.
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from queue import Queue
 
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
 
-ALGORITHMS = sorted(hashlib.algorithms_available)
-BUFSIZE = 1024 * 16
+ALGORITHMS = tuple(sorted(hashlib.algorithms_available))
+BUFSIZE = 1024 * 1024
+# Beyond a handful of concurrent files, the disk is the bottleneck, not the
+# CPU, and more threads just add seeking.
+JOBS = min(8, os.cpu_count() or 1)
 DIGEST_LENGTH_REQUIRED = {"shake_128", "shake_256"}
+DIGEST_LENGTH_REQUIRED_HELP = ", ".join(sorted(DIGEST_LENGTH_REQUIRED))
+UNBUFFERED_MIN = 1024 * 64
+OUTPUT_BATCH = 1024
+WILLNEED_MAX = 1024 * 1024 * 64
+READ_DEPTH = 4
+# The most leaves a tree digest (-t) may have.
+TREE_MAX = 1024 * 64
+
+# Algorithms for which PyCryptodome, if it's installed, provides an
+# alternative implementation, mapped to the Crypto.Hash module providing it.
+PYCRYPTODOME_MODULES = {
+    "sha224": "Crypto.Hash.SHA224",
+    "sha256": "Crypto.Hash.SHA256",
+    "sha384": "Crypto.Hash.SHA384",
+    "sha512": "Crypto.Hash.SHA512",
+}
+PROBE_SIZE = 1024 * 64
+# The smallest file worth importing and timing PyCryptodome for.
+PROBE_MIN = 1024 * 1024 * 64
+
+# Algorithms the Linux kernel crypto API can hash, mapped to their kernel
+# names, and the most a single sendfile() call will transfer on Linux.
+KERNEL_HASH_NAMES = {
+    "md5": "md5",
+    "sha1": "sha1",
+    "sha224": "sha224",
+    "sha256": "sha256",
+    "sha384": "sha384",
+    "sha512": "sha512",
+}
+SENDFILE_MAX = 0x7FFFF000
+
+# Algorithms for which OpenSSL has hardware-accelerated implementations.
+OPENSSL_ACCELERATED = {"md5", "sha1", "sha224", "sha256", "sha384", "sha512"}
 
 # ---------------------------------------------------------------------------
 # Classes
@@ -84,6 +150,9 @@ class Params:
     digest_length: Optional[int]
     algorithm: str
     paths: Seq[str]
+    jobs: int
+    tree: Optional[int]
+    kernel: bool
 
 
 class DigestError(Exception):
@@ -91,6 +160,24 @@ class DigestError(Exception):
     Thrown to indicate an error in processing.
     """
 
+
+class BufferCache(local):  # pylint: disable=too-few-public-methods
+    """
+    Per-thread cache of idle read buffers, so hashing many files doesn't
+    map (and unmap) fresh buffers for each one. Only buffers of the most
+    recently used size are kept, so a caller that keeps changing the size
+    doesn't pile up buffers it'll never use again. A buffer is only ever
+    used by the thread that took it from the cache, and the buffers are
+    released when the thread exits.
+    """
+
+    def __init__(self) -> None:
+        self.size = 0
+        self.free: List[memoryview] = []
+
+
+BUFFER_CACHE = BufferCache()
+
 # ---------------------------------------------------------------------------
 # Functions
 # ---------------------------------------------------------------------------
@@ -100,6 +187,30 @@ def parse_params() -> Params:
     """
     Parse command-line parameters, returning a Params object.
     """
+    # The common "digest algorithm path ..." form, with no options, doesn't
+    # need argparse. Skipping it (and its import) shortens startup, which
+    # adds up when digest is run many times, e.g., via "find -exec". It
+    # must build the same Params argparse would.
+    argv = sys.argv[1:]
+    if (
+        argv
+        and argv[0] in ALGORITHMS
+        and argv[0] not in DIGEST_LENGTH_REQUIRED
+        and not any(arg.startswith("-") for arg in argv)
+    ):
+        block_size = resolve_algorithm(argv[0])
+        return Params(
+            buffer_size=block_aligned(BUFSIZE, block_size),
+            digest_length=None,
+            algorithm=argv[0],
+            paths=argv[1:],
+            jobs=JOBS,
+            tree=None,
+            kernel=False,
+        )
+
+    import argparse  # pylint: disable=import-outside-toplevel
+
     def positive_number(s: str) -> int:
         """
         Ensure that a string is a positive number and, if it is, return
@@ -124,16 +235,46 @@ def parse_params() -> Params:
         metavar="N",
         type=positive_number,
         default=BUFSIZE,
-        help="Buffer size (in bytes) to use when reading. "
-        "Defaults to %(default)d.",
+        help="Buffer size (in bytes) to use when reading. It's rounded up "
+        "to a whole number of the algorithm's blocks, and buffers are "
+        "page-aligned. Defaults to %(default)d.",
     )
-    length_required = ", ".join(sorted(DIGEST_LENGTH_REQUIRED))
     parser.add_argument(
         "-l",
         "--digest-length",
         type=positive_number,
         help="Length to use, for variable-length digests. "
-        f"Required for: {length_required}",
+        f"Required for: {DIGEST_LENGTH_REQUIRED_HELP}",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        metavar="N",
+        type=positive_number,
+        default=JOBS,
+        help="Number of files (or, with -t, ranges of a file) to hash in "
+        "parallel. Defaults to the number of CPUs, up to 8: %(default)d.",
+    )
+    kernel_algorithms = ", ".join(sorted(KERNEL_HASH_NAMES))
+    parser.add_argument(
+        "-k",
+        "--kernel",
+        action="store_true",
+        help="On Linux, have the kernel hash regular files, via its crypto "
+        "API (AF_ALG), falling back to the usual method if it can't. This "
+        "can be faster on CPUs whose hash accelerators only the kernel "
+        f"drives. Applies to: {kernel_algorithms}",
+    )
+    parser.add_argument(
+        "-t",
+        "--tree",
+        metavar="N",
+        type=positive_number,
+        help="Calculate a tree digest: split each file into N ranges, hash "
+        "the ranges in parallel, and hash the concatenated range digests. "
+        "The result is NOT the plain digest of the file, and is labeled "
+        "ALGORITHM-TREE:N. Standard input must be a regular file. N can "
+        f"be at most {TREE_MAX:,}.",
     )
     parser.add_argument(
         "-v", "--version", action="version", version=f"%(prog)s {__version__}"
@@ -143,7 +284,8 @@ def parse_params() -> Params:
         action="store",
         metavar="algorithm",
         choices=ALGORITHMS,
-        help="The digest algorithm to use, one of: " + ", ".join(ALGORITHMS),
+        # argparse only expands %(choices)s if the help is displayed.
+        help="The digest algorithm to use, one of: %(choices)s",
     )
     parser.add_argument(
         "path",
@@ -162,6 +304,11 @@ def parse_params() -> Params:
             "digest length via -l or --digest-length."
         )
 
+    if (args.tree is not None) and (args.tree > TREE_MAX):
+        raise DigestError(
+            f"A tree digest can have at most {TREE_MAX:,} leaves (-t)."
+        )
+
     if (args.algorithm not in DIGEST_LENGTH_REQUIRED) and (
         args.digest_length is not None
     ):
@@ -171,19 +318,433 @@ def parse_params() -> Params:
         )
         args.digest_length = None
 
+    block_size = resolve_algorithm(args.algorithm)
     return Params(
-        buffer_size=args.bufsize,
+        buffer_size=block_aligned(args.bufsize, block_size),
         digest_length=args.digest_length,
         algorithm=args.algorithm,
         paths=args.path,
+        jobs=args.jobs,
+        tree=args.tree,
+        kernel=args.kernel,
     )
 
 
+@lru_cache(maxsize=None)
+def hash_constructor(algorithm: str, probe: bool = False) -> Callable[[], Any]:
+    """
+    Return a callable that creates a new hash object for an algorithm.
+
+    hashlib's implementation is only as fast as the OpenSSL it's linked
+    against; older builds may lack the SHA extensions (SHA-NI) code paths.
+    So, if asked to probe, then for algorithms PyCryptodome also implements,
+    if PyCryptodome is installed, time both implementations on a small
+    buffer and return whichever is faster. The choice is made once per
+    algorithm. Only probe if nothing else will be hashing at the same time:
+    unlike hashlib, PyCryptodome doesn't release the GIL while it hashes, so
+    threads using it take turns.
+
+    Raises a DigestError if the algorithm can't be used (e.g., because it's
+    unknown, or disabled by the OpenSSL configuration).
+
+    :param algorithm: The algorithm to use.
+    :param probe:     Whether to consider PyCryptodome's implementation.
+    """
+    # The named constructors (hashlib.sha256, etc.) skip the by-name lookup
+    # hashlib.new() does each time it's called.
+    if algorithm in hashlib.algorithms_guaranteed:
+        default = getattr(hashlib, algorithm)
+    else:
+        default = partial(hashlib.new, algorithm)
+
+    try:
+        default()
+    except ValueError as ex:
+        # pylint: disable=raise-missing-from
+        raise DigestError(f"{algorithm}: {ex}")
+
+    candidates: List[Callable[[], Any]] = [default]
+    module_name = PYCRYPTODOME_MODULES.get(algorithm)
+    if probe and module_name is not None:
+        try:
+            candidates.append(import_module(module_name).new)
+        except ImportError:
+            pass
+
+    if len(candidates) == 1:
+        return candidates[0]
+
+    data = bytes(PROBE_SIZE)
+
+    def elapsed(new_hash: Callable[[], Any]) -> float:
+        start = time.perf_counter()
+        for _ in range(4):
+            new_hash().update(data)
+        return time.perf_counter() - start
+
+    return min(candidates, key=elapsed)
+
+
+def resolve_algorithm(algorithm: str) -> int:
+    """
+    Resolve (and validate) the hash implementation for an algorithm once,
+    up front, before any files are opened. If it turns out hashlib isn't
+    using OpenSSL for an algorithm OpenSSL would accelerate (e.g., with the
+    SHA extensions or AVX2), warn about it: the interpreter was probably
+    built without OpenSSL, or against a broken copy, and hashing will be
+    much slower than it could be. Returns the algorithm's block size, so
+    the buffer size can be settled once, too. Raises a DigestError if the
+    algorithm can't be used.
+
+    :param algorithm: The algorithm to use.
+    """
+    h = hash_constructor(algorithm)()
+    # OpenSSL's hash objects come from _hashlib; the built-in fallbacks come
+    # from modules like _sha256.
+    module = type(h).__module__
+    builtin = module.startswith("_") and module != "_hashlib"
+    if algorithm in OPENSSL_ACCELERATED and builtin:
+        print(
+            f"WARNING: {algorithm} is using Python's built-in "
+            "implementation, not OpenSSL's. Hashing will be slow.",
+            file=sys.stderr,
+        )
+
+    return getattr(h, "block_size", 1)
+
+
+def block_aligned(bufsize: int, block_size: int) -> int:
+    """
+    Round a buffer size up to the next multiple of a hash block size.
+
+    :param bufsize:    The buffer size.
+    :param block_size: The block size of the hash algorithm.
+    """
+    if block_size <= 1:
+        return bufsize
+
+    return -(-bufsize // block_size) * block_size
+
+
+def file_size(f: BinaryIO) -> Optional[int]:
+    """
+    Return the size of a file, if it's a regular file. Return None for
+    anything else (pipes, terminals, in-memory streams, etc.).
+
+    :param f: The file to check.
+    """
+    try:
+        st = os.fstat(f.fileno())
+    except (AttributeError, OSError, ValueError):
+        return None
+
+    return st.st_size if stat.S_ISREG(st.st_mode) else None
+
+
+def advise(f: BinaryIO, advice: str, length: int = 0) -> None:
+    """
+    Pass an access-pattern hint for the start of a file (by default, all of
+    it) to the kernel via posix_fadvise(). Does nothing on platforms without
+    posix_fadvise(), or if the hint is rejected.
+
+    :param f:      The file.
+    :param advice: The name of the advice constant in the os module
+                   (e.g., "POSIX_FADV_SEQUENTIAL").
+    :param length: The number of bytes the hint applies to, or 0 for the
+                   entire file.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+
+    try:
+        os.posix_fadvise(f.fileno(), 0, length, getattr(os, advice))
+    except (AttributeError, OSError, ValueError):
+        pass
+
+
+@contextmanager
+def aligned_buffer(size: int) -> Iterator[memoryview]:
+    """
+    Allocate a read buffer from an anonymous memory map, which, unlike a
+    bytearray, is guaranteed to be page-aligned. That lets the vectorized
+    hash implementations use aligned loads. Yields a writable memoryview
+    of the buffer. On exit, the buffer goes back to the calling thread's
+    BufferCache, to be reused for the next file.
+
+    :param size: The size of the buffer.
+    """
+    cache = BUFFER_CACHE
+    if cache.size != size:
+        cache.size = size
+        cache.free = []
+
+    mv = cache.free.pop() if cache.free else memoryview(mmap.mmap(-1, size))
+    yield mv
+    # Only reached if the caller finished cleanly. After an error, something
+    # (e.g., an abandoned reader thread) may still be using the buffer, so
+    # it's left for the garbage collector instead of being reused. Likewise
+    # if the cache has moved on to another size meanwhile.
+    if cache.size == size:
+        cache.free.append(mv)
+
+
+def update_serial(h: Any, f: BinaryIO, bufsize: int) -> None:
+    """
+    Feed the contents of a file to a hash object, one buffer at a time.
+
+    :param h:       The hash object to update.
+    :param f:       The file to read.
+    :param bufsize: The buffer size to use when reading.
+    """
+    # With small buffers, the loop runs often enough that looking up the
+    # bound methods on every pass shows up, so look them up once.
+    # Pyright can't grok BinaryIO.readinto(), so just disable it for this
+    # line.
+    readinto = f.readinto  # pyright: ignore
+    update = h.update
+    with aligned_buffer(bufsize) as mv:
+        while True:
+            n = readinto(mv)
+            if not n:
+                break
+            # Slicing the memoryview hands hashlib a zero-copy view of the
+            # bytes just read.
+            update(mv[:n])
+
+
+@lru_cache(maxsize=None)
+def read_pool() -> "ThreadPoolExecutor":
+    """
+    Return the thread pool update_preads() reads on, creating it the first
+    time it's needed. It's shared by every file, and every thread hashing
+    one, rather than started (and stopped) for each file.
+    """
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ThreadPoolExecutor
+
+    return ThreadPoolExecutor(max_workers=READ_DEPTH * JOBS)
+
+
+def update_preads(h: Any, f: BinaryIO, size: int, bufsize: int) -> None:
+    """
+    Feed the contents of a regular file to a hash object, keeping several
+    reads, at successive offsets, in flight at once on a pool of threads.
+    Fast storage (e.g., NVMe) only reaches full speed with more than one
+    outstanding request. The buffers are hashed in file order, and each one
+    is reused for a later read once it's been hashed. Each read is handed
+    to another thread, so this only pays off for large buffers.
+
+    :param h:       The hash object to update.
+    :param f:       The file to read. It must be a regular file.
+    :param size:    The size of the file.
+    :param bufsize: The buffer size to use when reading.
+    """
+    fd = f.fileno()
+    update = h.update
+
+    def read_at(mv: memoryview, offset: int) -> int:
+        # A positional read can come up short, so keep reading until the
+        # buffer is full or the file ends.
+        n = 0
+        while n < len(mv):
+            count = os.preadv(fd, [mv[n:]], offset + n)
+            if count == 0:
+                break
+            n += count
+        return n
+
+    offsets = iter(range(f.tell(), size, bufsize))
+    submit = read_pool().submit
+    with ExitStack() as stack:
+        buffers = [
+            stack.enter_context(aligned_buffer(bufsize))
+            for _ in range(READ_DEPTH)
+        ]
+        pending: Deque[Tuple["Future[int]", memoryview]] = deque(
+            (submit(read_at, mv, offset), mv)
+            for mv, offset in zip(buffers, offsets)
+        )
+        try:
+            while pending:
+                future, mv = pending.popleft()
+                update(mv[: future.result()])
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append((submit(read_at, mv, offset), mv))
+        finally:
+            # After an error, don't leave reads running on a file that's
+            # about to be closed: cancel them or, if they've started, wait.
+            for future, _ in pending:
+                if not future.cancel():
+                    future.exception()
+
+
+def update_pipelined(h: Any, f: BinaryIO, bufsize: int) -> None:
+    """
+    Feed the contents of a file to a hash object, reading the next buffer
+    on a background thread while the current one is being hashed. hashlib
+    releases the GIL while it hashes large buffers, so reading and hashing
+    overlap.
+
+    :param h:       The hash object to update.
+    :param f:       The file to read.
+    :param bufsize: The buffer size to use when reading.
+    """
+    # pylint: disable=import-outside-toplevel
+    from queue import Queue
+
+    # Buffers circulate between the two queues: the reader takes an empty
+    # one from "free", fills it and puts it on "full"; the hasher hashes it
+    # and hands it back. A None on "free" tells the reader to quit.
+    free: "Queue[Optional[memoryview]]" = Queue()
+    full: "Queue[Union[Tuple[memoryview, int], BaseException]]" = Queue()
+
+    def reader() -> None:
+        readinto = f.readinto  # pyright: ignore
+        try:
+            while True:
+                mv = free.get()
+                if mv is None:
+                    return
+                n = readinto(mv)
+                full.put((mv, n or 0))
+                if not n:
+                    return
+        except BaseException as ex:  # pylint: disable=broad-except
+            full.put(ex)
+
+    with aligned_buffer(bufsize) as first, aligned_buffer(bufsize) as second:
+        free.put(first)
+        free.put(second)
+        thread = Thread(target=reader, daemon=True)
+        thread.start()
+        update = h.update
+        try:
+            while True:
+                item = full.get()
+                if isinstance(item, BaseException):
+                    raise item
+                mv, n = item
+                if n == 0:
+                    break
+                update(mv[:n])
+                free.put(mv)
+        finally:
+            free.put(None)
+
+        thread.join()
+
+
+def kernel_digest(
+    f: BinaryIO, algorithm: str, size: int, digest_size: int
+) -> Optional[bytes]:
+    """
+    Calculate the digest of a regular file in the kernel, via the Linux
+    kernel crypto API (an AF_ALG socket). The file's pages go to the kernel
+    with sendfile(), so they're never copied into user space, and the
+    kernel uses whatever hash accelerator it has a driver for. Returns None
+    if the kernel can't do it (e.g., not on Linux, algorithm not available,
+    AF_ALG blocked by a sandbox), in which case the caller should hash the
+    file itself.
+
+    :param f:           The file. It must be a regular file, positioned at
+                        its start.
+    :param algorithm:   The algorithm to use.
+    :param size:        The size of the file.
+    :param digest_size: The size of the digest, in bytes.
+    """
+    # Only needed here, and only if asked for, so don't pay for the import
+    # otherwise.
+    import socket  # pylint: disable=import-outside-toplevel
+
+    name = KERNEL_HASH_NAMES.get(algorithm)
+    if name is None or not hasattr(socket, "AF_ALG") or size > SENDFILE_MAX:
+        return None
+
+    try:
+        with socket.socket(socket.AF_ALG, socket.SOCK_SEQPACKET) as alg:
+            alg.bind(("hash", name))
+            op, _ = alg.accept()
+            with op:
+                # The kernel finishes the hash when a sendfile() call ends,
+                # so the whole file has to go in one call.
+                if os.sendfile(op.fileno(), f.fileno(), 0, size) != size:
+                    return None
+                return op.recv(digest_size)
+    except OSError:
+        return None
+
+
+def update_hash(
+    h: Any, f: BinaryIO, size: Optional[int], bufsize: int
+) -> None:
+    """
+    Feed the contents of a file to a hash object, using the fastest
+    strategy available for the kind of file it is.
+
+    :param h:       The hash object to update.
+    :param f:       The file to read.
+    :param size:    The size of the file, if it's a regular file, or None.
+    :param bufsize: The buffer size to use when reading.
+    """
+    # Some regular files (e.g., in /proc) claim to be empty but aren't, so
+    # the size-based strategies are only for non-empty files.
+    if (
+        size
+        and bufsize >= BUFSIZE
+        and size >= bufsize * READ_DEPTH
+        and hasattr(os, "preadv")
+    ):
+        # Large files, read in large buffers, are read with several requests
+        # in flight at once. For anything smaller, handing the reads to
+        # other threads costs more than it saves.
+        update_preads(h, f, size, bufsize)
+    elif size is not None:
+        # The kernel already reads ahead in regular files, so a plain loop
+        # over a cached buffer is all they need.
+        update_serial(h, f, bufsize)
+    else:
+        update_pipelined(h, f, bufsize)
+
+
+def raw_digest(h: Any, digest_length: Optional[int] = None) -> bytes:
+    """
+    Return the (binary) digest of a hash object.
+
+    :param h:             The hash object.
+    :param digest_length: The length of the digest, for variable-length
+                          algorithms.
+    """
+    # Some algorithms (e.g., the SHAKE algorithms) are variable length, and
+    # their digest() functions take a length parameter. But the generic
+    # digest() function doesn't, and the typing doesn't capture this
+    # difference. So, type-checkers like pyright complain about the first
+    # call, below. For now, we just disable pyright for that line.
+    if digest_length is not None:
+        return h.digest(digest_length)  # pyright: ignore
+
+    return h.digest()
+
+
+@lru_cache(maxsize=None)
+def empty_digest(algorithm: str, digest_length: Optional[int] = None) -> str:
+    """
+    Return the (hex) digest of no data at all, calculated once per
+    algorithm and digest length.
+
+    :param algorithm:     The algorithm to use.
+    :param digest_length: The length of the digest, for variable-length
+                          algorithms.
+    """
+    return raw_digest(hash_constructor(algorithm)(), digest_length).hex()
+
+
 def digest(
     f: BinaryIO,
     algorithm: str,
     bufsize: int,
     digest_length: Optional[int] = None,
+    kernel: bool = False,
 ) -> str:
     """
     Calculate a digest of the contents of a file. If an error occurs, this
@@ -194,65 +755,382 @@ def digest(
     :param bufsize:       The buffer size to use when reading.
     :param digest_length: The length of the digest, for variable-length
                           algorithms.
+    :param kernel:        Whether to try hashing regular files in the kernel
+                          first. See kernel_digest().
     """
+    size = file_size(f)
+    # PyCryptodome holds the GIL while it hashes, so it's only considered
+    # on the main thread: digest hashes files in parallel on other threads.
+    # And it's only worth probing for if the file is large.
+    probe = (
+        size is not None
+        and size >= PROBE_MIN
+        and current_thread() is main_thread()
+    )
+    # The algorithm is validated when its constructor is first resolved, so
+    # only the I/O and hashing need to be guarded.
+    h = hash_constructor(algorithm, probe)()
+    # Read whole blocks of the algorithm at a time, so the hash never has to
+    # carry a partial block over from one buffer to the next. (parse_params()
+    # has already done this for command-line sizes; it's cheap to repeat.)
+    bufsize = block_aligned(bufsize, getattr(h, "block_size", 1))
+    # A file that fits in one read is read in one go, so readahead can't
+    # help it, and it's too small to crowd anything out of the cache.
+    hinted = size if size is not None and size > bufsize else 0
     try:
-        h = hashlib.new(algorithm)
-        buf = bytearray(bufsize)
-        while True:
-            # Pyright can't grok BinaryIO.readinto(), so just disable it for
-            # this line.
-            n = f.readinto(buf)  # pyright: ignore
-            if n <= 0:
-                break
-            h.update(buf[:n])
+        if hinted:
+            # The file is read once, front to back: ask for aggressive
+            # readahead now, and drop the pages from the cache when done.
+            # Also start reading the beginning of the file right away; not
+            # all of it, since a huge file could push the end of its own
+            # readahead out of the cache before it's hashed.
+            advise(f, "POSIX_FADV_SEQUENTIAL")
+            advise(f, "POSIX_FADV_WILLNEED", min(hinted, WILLNEED_MAX))
+
+        raw = None
+        if kernel and size and f.tell() == 0:
+            raw = kernel_digest(f, algorithm, size, h.digest_size)
+        if raw is None:
+            update_hash(h, f, size, bufsize)
+            raw = raw_digest(h, digest_length)
 
-        # Some algorithms (e.g., the SHAKE algorithms) are variable length, and
-        # their hexdigest() functions take a length parameter. But the generic
-        # hexdigest() function doesn't, and the typing doesn't capture this
-        # difference. So, type-checkers like pyright complain about the first
-        # call, below. For now, we just disable pyright for that line.
-        if digest_length is not None:
-            return h.hexdigest(digest_length)  # pyright: ignore
+        if hinted:
+            advise(f, "POSIX_FADV_DONTNEED")
 
-        return h.hexdigest()
+        # bytes.hex() is a single pass in C, whereas some hash
+        # implementations (e.g., PyCryptodome's) do hexdigest() in Python.
+        return raw.hex()
     except Exception as ex:
         # pylint: disable=raise-missing-from
         raise DigestError(f"{algorithm}: {ex}")
 
 
-def main() -> int:
+def leaf_digests(
+    mv: memoryview,
+    ranges: Seq[Tuple[int, int]],
+    new_hash: Callable[[], Any],
+    digest_length: Optional[int],
+    jobs: int,
+) -> bytes:
     """
-    Main program.
+    Hash ranges of a buffer in parallel, returning the concatenated
+    digests of the ranges, in order.
+
+    :param mv:            The buffer (e.g., a memory-mapped file).
+    :param ranges:        The (start, end) offsets of the ranges to hash.
+    :param new_hash:      Creates a new hash object.
+    :param digest_length: The length of the digest, for variable-length
+                          algorithms.
+    :param jobs:          The number of ranges to hash in parallel.
     """
-    params: Params = parse_params()
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import ThreadPoolExecutor
+
+    def leaf_digest(r: Tuple[int, int]) -> bytes:
+        h = new_hash()
+        h.update(mv[r[0] : r[1]])
+        return raw_digest(h, digest_length)
+
+    with ThreadPoolExecutor(max_workers=min(jobs, len(ranges))) as ex:
+        return b"".join(ex.map(leaf_digest, ranges))
+
+
+def tree_digest(
+    f: BinaryIO,
+    algorithm: str,
+    leaves: int,
+    jobs: int,
+    digest_length: Optional[int] = None,
+) -> str:
+    """
+    Calculate a tree digest of the contents of a regular file. The file is
+    split into a number of equal-sized ranges (leaves), aligned to the
+    algorithm's block size, and the leaves are hashed in parallel. The
+    result is the digest of the concatenated leaf digests, followed by the
+    number of leaves as an 8-byte big-endian integer. It is NOT the same as
+    the plain digest of the file. If an error occurs, this function raises
+    a DigestError.
+
+    :param f:             The file to read. It must be a regular file.
+    :param algorithm:     The algorithm to use.
+    :param leaves:        The number of ranges to split the file into.
+    :param jobs:          The number of ranges to hash in parallel.
+    :param digest_length: The length of the digest, for variable-length
+                          algorithms.
+    """
+    new_hash = hash_constructor(algorithm)
+    root = new_hash()
+    size = file_size(f)
+    if size is None:
+        raise DigestError("A tree digest requires a regular file.")
+
+    # The leaves depend on the size, so a file that claims to be empty but
+    # isn't (e.g., in /proc) can't be split up.
+    if size == 0 and hasattr(os, "pread") and os.pread(f.fileno(), 1, 0):
+        raise DigestError(
+            "A tree digest requires a file whose size is known, and this "
+            "one claims to be empty, but isn't."
+        )
 
     try:
-        if len(params.paths) == 0:
-            # Standard input.
-            print(
-                digest(
-                    f=sys.stdin.buffer,
-                    algorithm=params.algorithm,
-                    bufsize=params.buffer_size,
-                    digest_length=params.digest_length,
+        leaf_size = block_aligned(
+            -(-size // leaves), getattr(root, "block_size", 1)
+        )
+        # Rounding the leaf size up can leave the last few leaves empty (all
+        # of them, for an empty file). They all have the same digest, so
+        # only the non-empty ones are hashed on threads.
+        ranges = [
+            (offset, min(offset + leaf_size, size))
+            for offset in (range(0, size, leaf_size) if size else ())
+        ]
+
+        # An empty file can't be mapped, but it has no leaves to hash.
+        if ranges:
+            with (
+                mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm,
+                memoryview(mm) as mv,
+            ):
+                root.update(
+                    leaf_digests(mv, ranges, new_hash, digest_length, jobs)
                 )
-            )
 
-        else:
-            u_algorithm = params.algorithm.upper()
-            for path in params.paths:
-                if not os.path.isfile(path):
-                    print(f'*** Skipping non-file "{path}".')
+        empty = raw_digest(new_hash(), digest_length)
+        root.update(empty * (leaves - len(ranges)))
+
+        root.update(leaves.to_bytes(8, "big"))
+        return raw_digest(root, digest_length).hex()
+    except Exception as ex:
+        # pylint: disable=raise-missing-from
+        raise DigestError(f"{algorithm}: {ex}")
+
+
+def digest_params(f: BinaryIO, params: Params) -> str:
+    """
+    Calculate the digest of the contents of a file, as specified by the
+    command-line parameters: a tree digest if one was requested, a plain
+    digest otherwise. If an error occurs, this function raises a
+    DigestError.
+
+    :param f:      The file to read.
+    :param params: The parsed command-line parameters.
+    """
+    if params.tree is not None:
+        return tree_digest(
+            f=f,
+            algorithm=params.algorithm,
+            leaves=params.tree,
+            jobs=params.jobs,
+            digest_length=params.digest_length,
+        )
+
+    return digest(
+        f=f,
+        algorithm=params.algorithm,
+        bufsize=params.buffer_size,
+        digest_length=params.digest_length,
+        kernel=params.kernel,
+    )
+
+
+@lru_cache(maxsize=None)
+def can_reopen() -> bool:
+    """
+    Return whether a file opened with O_PATH can be reopened for reading
+    through /proc/self/fd (i.e., on Linux, with /proc mounted).
+    """
+    return hasattr(os, "O_PATH") and os.path.isdir("/proc/self/fd")
+
+
+def open_regular_file(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Open a file for reading, if it's a regular file, returning its file
+    descriptor and its size. Returns None if the path doesn't exist or
+    isn't a regular file.
+
+    :param path: The path to the file.
+    """
+    # The path is opened first and the open file checked, rather than
+    # stat()ing the path and then opening it: that's one path lookup, and
+    # the file checked is the file read. Opening a device to read it can
+    # have side effects (e.g., rewinding a tape), though, so where there's
+    # O_PATH, the path is opened with that, which doesn't open the file
+    # itself, and only a regular file is then reopened for reading.
+    # Elsewhere, open non-blocking, or opening a FIFO would wait for a
+    # writer forever; and don't let a terminal become our controlling
+    # terminal.
+    flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+    reopen = can_reopen()
+    if reopen:
+        first_flags = os.O_PATH
+    else:
+        first_flags = flags
+        for name in ("O_NONBLOCK", "O_NOCTTY"):
+            first_flags |= getattr(os, name, 0)
+
+    try:
+        fd = os.open(path, first_flags)
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+
+    try:
+        st = os.fstat(fd)
+        is_file = stat.S_ISREG(st.st_mode)
+        if is_file and reopen:
+            path_fd, fd = fd, os.open(f"/proc/self/fd/{fd}", flags)
+            os.close(path_fd)
+        elif is_file and hasattr(os, "O_NONBLOCK"):
+            # Non-blocking mode has no effect on regular files, but it's
+            # only there for the open, so put things back the way they're
+            # expected to be.
+            os.set_blocking(fd, True)
+    except OSError:
+        os.close(fd)
+        raise
+
+    if not is_file:
+        os.close(fd)
+        return None
+
+    return fd, st.st_size
+
+
+def digest_file(path: str, params: Params) -> Optional[str]:
+    """
+    Open a file and calculate its digest, using the algorithm, buffer size
+    and digest length in the supplied parameters. Returns None if the path
+    isn't a regular file. If an error occurs, this function raises a
+    DigestError.
+
+    :param path:   The path to the file.
+    :param params: The parsed command-line parameters.
+    """
+    opened = open_regular_file(path)
+    if opened is None:
+        return None
+
+    fd, size = opened
+    # Empty files are common in source trees, and all have the same digest.
+    # A size of 0 isn't proof, though: files in /proc and /sys report it,
+    # but have contents. So check with a one-byte read (which doesn't move
+    # the file position) before skipping the usual setup.
+    if (
+        size == 0
+        and params.tree is None
+        and hasattr(os, "pread")
+        and os.pread(fd, 1, 0) == b""
+    ):
+        os.close(fd)
+        return empty_digest(params.algorithm, params.digest_length)
+
+    # With a large enough read buffer, Python's own I/O buffering only adds
+    # a copy: read straight from the OS into our buffer instead.
+    if params.buffer_size >= UNBUFFERED_MIN:
+        buffering = 0
+    else:
+        buffering = params.buffer_size
+
+    with os.fdopen(fd, mode="rb", buffering=buffering) as f:
+        return digest_params(f, params)
+
+
+def digest_files(params: Params) -> int:
+    """
+    Calculate and print the digests of the files named in the command-line
+    parameters. Paths that aren't regular files are skipped. So are files
+    that can't be opened or read, for whatever reason; the other files are
+    still hashed. Returns the number of files that couldn't be hashed.
+
+    :param params: The parsed command-line parameters.
+    """
+    u_algorithm = params.algorithm.upper()
+    if params.tree is not None:
+        u_algorithm = f"{u_algorithm}-TREE:{params.tree}"
+
+    # Each file is independent, and hashlib releases the GIL while it hashes
+    # large buffers, so threads hash several files at once. map() yields the
+    # results in command-line order. A tree digest already hashes each file
+    # in parallel, so do one file at a time. With only one file at a time,
+    # there's no need for a thread pool at all.
+    if params.tree is not None:
+        workers = 1
+    else:
+        workers = min(len(params.paths), params.jobs)
+
+    # Output is written in batches, rather than a print() per file, unless
+    # someone is watching it arrive. Skip notices go to standard error, so
+    # they don't get mixed in with the digests, and they're written all at
+    # once at the end.
+    interactive = sys.stdout.isatty()
+
+    def digest_path(path: str) -> Union[str, Exception, None]:
+        # A file that can't be opened (e.g., for lack of permission) or read
+        # (e.g., an I/O error) is skipped, rather than ending the whole run.
+        try:
+            return digest_file(path, params)
+        except (DigestError, OSError) as ex:
+            return ex
+
+    lines: List[str] = []
+    skipped: List[str] = []
+    failed = 0
+    try:
+        with ExitStack() as stack:
+            results: Iterator[Union[str, Exception, None]]
+            if workers > 1:
+                # pylint: disable=import-outside-toplevel
+                from concurrent.futures import ThreadPoolExecutor
+
+                executor = stack.enter_context(
+                    ThreadPoolExecutor(max_workers=workers)
+                )
+                results = executor.map(digest_path, params.paths)
+            else:
+                results = map(digest_path, params.paths)
+
+            for path, d in zip(params.paths, results):
+                if d is None:
+                    skipped.append(f'*** Skipping non-file "{path}".\n')
+                    continue
+
+                if isinstance(d, Exception):
+                    # Not every OSError has an error number and message.
+                    reason = getattr(d, "strerror", None) or str(d)
+                    skipped.append(f'*** Skipping "{path}": {reason}\n')
+                    failed += 1
                     continue
 
-                with open(path, mode="rb") as f:
-                    d = digest(
-                        f=f,
-                        algorithm=params.algorithm,
-                        bufsize=params.buffer_size,
-                        digest_length=params.digest_length,
-                    )
-                    print(f"{u_algorithm} ({path}): {d}")
+                lines.append(f"{u_algorithm} ({path}): {d}\n")
+                # A tree digest maps the whole file, and if the file is
+                # truncated meanwhile, the process dies of SIGBUS. Don't
+                # take the digests already calculated down with it.
+                if (
+                    interactive
+                    or params.tree is not None
+                    or len(lines) >= OUTPUT_BATCH
+                ):
+                    sys.stdout.write("".join(lines))
+                    lines.clear()
+    finally:
+        sys.stdout.write("".join(lines))
+        sys.stderr.write("".join(skipped))
+
+    return failed
+
+
+def main() -> int:
+    """
+    Main program.
+    """
+    try:
+        params: Params = parse_params()
+        if len(params.paths) == 0:
+            # Standard input. Read from the underlying raw file, if there is
+            # one: the buffered reader on top of it only adds a copy.
+            stdin = getattr(sys.stdin.buffer, "raw", sys.stdin.buffer)
+            print(digest_params(stdin, params))
+
+        elif digest_files(params) > 0:
+            return 1
     except DigestError as ex:
         print(f"Error: {ex}", file=sys.stderr)
         return 1
@@ -5,31 +5,36 @@ import os
 sys.path += [os.getcwd()]
 
 from setuptools import setup, find_packages
-import re
-import imp
+import ast
 
 PKG = 'digest'
 DESCRIPTION = 'Calculate message digests of files or standard input'
+INFO_KEYS = {'__version__', '__url__', '__license__', '__author__',
+             '__email__'}
 
 def load_info():
-    # Look for identifiers beginning with "__" at the beginning of the line.
+    # Parse the module, rather than importing it, to get the docstring and
+    # the string-valued identifiers beginning and ending with "__".
 
     result = {}
-    pattern = re.compile(r'^(__\w+__)\s*=\s*[\'"]([^\'"]*)[\'"]')
     here = os.path.dirname(os.path.abspath(sys.argv[0]))
-    for line in open(os.path.join(here, PKG, '__init__.py'), 'r'):
-        match = pattern.match(line)
-        if match:
-            result[match.group(1)] = match.group(2)
-
-    sys.path = [here] + sys.path
-    mf = os.path.join(here, PKG, '__init__.py')
-    try:
-        m = imp.load_module(PKG, open(mf), mf,
-                            ('__init__.py', 'r', imp.PY_SOURCE))
-        result['long_description'] = m.__doc__
-    except:
-        result['long_description'] = DESCRIPTION
+    with open(os.path.join(here, PKG, '__init__.py'), 'r') as f:
+        tree = ast.parse(f.read())
+
+    for node in tree.body:
+        if INFO_KEYS.issubset(result):
+            # The metadata is all near the top; no need to look further.
+            break
+        if not isinstance(node, ast.Assign) or len(node.targets) != 1:
+            continue
+        target = node.targets[0]
+        if (isinstance(target, ast.Name) and
+            target.id.startswith('__') and target.id.endswith('__') and
+            isinstance(node.value, ast.Constant) and
+            isinstance(node.value.value, str)):
+            result[target.id] = node.value.value
+
+    result['long_description'] = ast.get_docstring(tree) or DESCRIPTION
     return result
 
 info = load_info()
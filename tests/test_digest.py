@@ -0,0 +1,283 @@
+"""
+Tests for the digest module.
+"""
+
+import dataclasses
+import hashlib
+import io
+import os
+import random
+import socket
+import sys
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+import digest
+
+
+@pytest.mark.parametrize(
+    "args", [["sha256"], ["sha256", "a"], ["md5", "a", "b", "c"]]
+)
+def test_parse_params_fast_path_matches_argparse(
+    monkeypatch: pytest.MonkeyPatch, args: List[str]
+) -> None:
+    monkeypatch.setattr(sys, "argv", ["digest", *args])
+    fast = digest.parse_params()
+    # A "--" isn't an option, to argparse, but it keeps the fast path from
+    # being taken.
+    monkeypatch.setattr(sys, "argv", ["digest", "--", *args])
+    slow = digest.parse_params()
+    assert fast == slow
+
+
+def test_buffer_cache_keeps_only_the_latest_size() -> None:
+    for size in (4096, 8192, 4096, 12288):
+        with digest.aligned_buffer(size) as mv:
+            assert len(mv) == size
+
+    assert digest.BUFFER_CACHE.size == 12288
+    assert [len(mv) for mv in digest.BUFFER_CACHE.free] == [12288]
+
+
+BUFSIZE = digest.BUFSIZE
+PREADS_MIN = digest.BUFSIZE * digest.READ_DEPTH
+
+
+def random_bytes(size: int) -> bytes:
+    return random.Random(size).randbytes(size)
+
+
+def digest_path(path: Path, bufsize: int, start: int = 0) -> str:
+    with open(path, "rb", buffering=0) as f:
+        f.seek(start)
+        return digest.digest(f, "sha256", bufsize)
+
+
+# Sizes on either side of the read buffer, and of the size at which large
+# buffers are read in parallel (update_preads()).
+@pytest.mark.parametrize(
+    "size",
+    [
+        0,
+        1,
+        4095,
+        4096,
+        4097,
+        BUFSIZE - 1,
+        BUFSIZE,
+        BUFSIZE + 1,
+        PREADS_MIN - 1,
+        PREADS_MIN,
+        PREADS_MIN + 4097,
+    ],
+)
+@pytest.mark.parametrize("bufsize", [4096, BUFSIZE])
+def test_digest_regular_file(tmp_path: Path, size: int, bufsize: int) -> None:
+    data = random_bytes(size)
+    path = tmp_path / "data"
+    path.write_bytes(data)
+    assert digest_path(path, bufsize) == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize("bufsize", [4096, BUFSIZE])
+def test_digest_regular_file_from_offset(tmp_path: Path, bufsize: int) -> None:
+    data = random_bytes(PREADS_MIN + 123)
+    path = tmp_path / "data"
+    path.write_bytes(data)
+    expected = hashlib.sha256(data[100:]).hexdigest()
+    assert digest_path(path, bufsize, start=100) == expected
+
+
+@pytest.mark.parametrize("size", [0, 1, 4097, BUFSIZE * 3 + 1])
+def test_digest_stream(size: int) -> None:
+    data = random_bytes(size)
+    expected = hashlib.sha256(data).hexdigest()
+    assert digest.digest(io.BytesIO(data), "sha256", 4096) == expected
+
+    r, w = os.pipe()
+
+    def write() -> None:
+        with os.fdopen(w, "wb") as pipe:
+            pipe.write(data)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    with os.fdopen(r, "rb", buffering=0) as f:
+        assert digest.digest(f, "sha256", 4096) == expected
+    writer.join()
+
+
+def test_digest_file_that_only_claims_to_be_empty() -> None:
+    path = Path("/proc/version")
+    if not path.exists() or path.stat().st_size != 0:
+        pytest.skip("No /proc file that claims to be empty.")
+
+    expected = hashlib.sha256(path.read_bytes()).hexdigest()
+    assert digest_path(path, 4096) == expected
+
+
+@pytest.mark.parametrize(
+    "algorithm, digest_length", [("sha256", None), ("shake_128", 20)]
+)
+def test_digest_file_empty(
+    tmp_path: Path, algorithm: str, digest_length: Optional[int]
+) -> None:
+    path = tmp_path / "empty"
+    path.write_bytes(b"")
+    params = digest.Params(
+        buffer_size=BUFSIZE,
+        digest_length=digest_length,
+        algorithm=algorithm,
+        paths=[str(path)],
+        jobs=1,
+        tree=None,
+        kernel=False,
+    )
+    h = hashlib.new(algorithm)
+    expected = h.hexdigest(digest_length) if digest_length else h.hexdigest()
+    assert digest.digest_file(str(path), params) == expected
+
+
+def test_open_regular_file_skips_fifos_and_devices(tmp_path: Path) -> None:
+    if not hasattr(os, "mkfifo"):
+        pytest.skip("No FIFOs here.")
+
+    # If the FIFO were opened for reading, this would wait for a writer.
+    fifo = tmp_path / "fifo"
+    os.mkfifo(fifo)
+    assert digest.open_regular_file(str(fifo)) is None
+    assert digest.open_regular_file(os.devnull) is None
+    assert digest.open_regular_file(str(tmp_path)) is None
+    assert digest.open_regular_file(str(tmp_path / "missing")) is None
+
+
+def test_digest_files_skips_unreadable_files(
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    tmp_path: Path,
+) -> None:
+    path = tmp_path / "data"
+    path.write_bytes(b"abc")
+    digest_file = digest.digest_file
+
+    def failing_digest_file(p: str, params: digest.Params) -> Optional[str]:
+        if p == "no-errno":
+            raise OSError("no error number")
+        if p == "bad-read":
+            raise digest.DigestError("sha256: [Errno 5] Input/output error")
+        return digest_file(p, params)
+
+    monkeypatch.setattr(digest, "digest_file", failing_digest_file)
+    monkeypatch.setattr(
+        sys, "argv", ["digest", "-j", "2", "sha256", "no-errno", "bad-read"]
+    )
+    params = digest.parse_params()
+    params = dataclasses.replace(params, paths=[*params.paths, str(path)])
+    assert digest.digest_files(params) == 2
+    out, err = capsys.readouterr()
+    assert out == f"SHA256 ({path}): {hashlib.sha256(b'abc').hexdigest()}\n"
+    assert err == (
+        '*** Skipping "no-errno": no error number\n'
+        '*** Skipping "bad-read": sha256: [Errno 5] Input/output error\n'
+    )
+
+
+def tree_digest_of(path: Path, algorithm: str, leaves: int) -> str:
+    with open(path, "rb") as f:
+        return digest.tree_digest(f, algorithm, leaves=leaves, jobs=2)
+
+
+def test_tree_digest_construction(tmp_path: Path) -> None:
+    # 200 bytes in 3 leaves: ceil(200 / 3) = 67 bytes, rounded up to a whole
+    # number of 64-byte SHA-256 blocks, is 128. So the leaves are [0, 128),
+    # [128, 200) and an empty one, followed by the leaf count.
+    data = bytes(range(200))
+    path = tmp_path / "data"
+    path.write_bytes(data)
+
+    def leaf(b: bytes) -> bytes:
+        return hashlib.sha256(b).digest()
+
+    expected = hashlib.sha256(
+        leaf(data[:128])
+        + leaf(data[128:])
+        + leaf(b"")
+        + (3).to_bytes(8, "big")
+    ).hexdigest()
+    assert tree_digest_of(path, "sha256", 3) == expected
+
+
+def test_tree_digest_known_answer(tmp_path: Path) -> None:
+    # Pins the ALGORITHM-TREE:N output format; if this changes, tree
+    # digests calculated by earlier versions no longer match.
+    path = tmp_path / "data"
+    path.write_bytes(bytes(range(200)))
+    assert tree_digest_of(path, "sha256", 3) == (
+        "d91ecdf4fdd08197001411399ded6a1c692dc26ab15b2289787d4122cd71a936"
+    )
+
+
+@pytest.mark.parametrize("size", [0, 3, 1000])
+def test_tree_digest_empty_leaves(tmp_path: Path, size: int) -> None:
+    # More leaves than blocks: all but the first few leaves are empty.
+    data = bytes(size)
+    path = tmp_path / "data"
+    path.write_bytes(data)
+    leaves = 50
+    leaf_size = 64 * -(-size // (64 * leaves))
+    digests = [
+        hashlib.sha256(data[i * leaf_size : (i + 1) * leaf_size]).digest()
+        for i in range(leaves)
+    ]
+    expected = hashlib.sha256(
+        b"".join(digests) + leaves.to_bytes(8, "big")
+    ).hexdigest()
+    assert tree_digest_of(path, "sha256", leaves) == expected
+
+
+def test_tree_digest_rejects_files_that_only_claim_to_be_empty() -> None:
+    path = Path("/proc/self/status")
+    if not path.exists() or path.stat().st_size != 0:
+        pytest.skip("No /proc file that claims to be empty.")
+
+    with pytest.raises(digest.DigestError, match="claims to be empty"):
+        tree_digest_of(path, "sha256", 2)
+
+
+def kernel_can_hash(algorithm: str) -> bool:
+    if not hasattr(socket, "AF_ALG"):
+        return False
+
+    try:
+        with socket.socket(socket.AF_ALG, socket.SOCK_SEQPACKET) as alg:
+            alg.bind(("hash", digest.KERNEL_HASH_NAMES[algorithm]))
+    except OSError:
+        return False
+
+    return True
+
+
+@pytest.mark.parametrize("algorithm", sorted(digest.KERNEL_HASH_NAMES))
+def test_kernel_digest_matches_hashlib(tmp_path: Path, algorithm: str) -> None:
+    if not kernel_can_hash(algorithm):
+        pytest.skip(f"The kernel can't hash {algorithm} here (AF_ALG).")
+
+    # Bigger than a pipe (64 KiB), so sendfile() has to split the transfer
+    # up internally, and the kernel mustn't finish the hash early.
+    data = os.urandom(1024 * 1024 + 123)
+    path = tmp_path / "data"
+    path.write_bytes(data)
+    expected = hashlib.new(algorithm, data)
+    with open(path, "rb", buffering=0) as f:
+        raw = digest.kernel_digest(
+            f, algorithm, len(data), expected.digest_size
+        )
+        assert raw == expected.digest()
+        f.seek(0)
+        assert (
+            digest.digest(f, algorithm, digest.BUFSIZE, kernel=True)
+            == expected.hexdigest()
+        )